@@ -0,0 +1,108 @@
+# audio_cache.py - Decoded PCM cache for repeated chunking
+import os
+import struct
+import hashlib
+import logging
+from pathlib import Path
+import numpy as np
+from pydub import AudioSegment
+
+logger = logging.getLogger(__name__)
+
+# Header: magic, format version, sample rate, channels, sample width (bytes), sample count
+HEADER_FORMAT = "<4sHIHHQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+MAGIC = b"UPCM"
+VERSION = 1
+
+class DecodedAudioCache:
+    """Decode each source once to raw 16 kHz mono PCM and serve memory-mapped slices"""
+
+    def __init__(self, cache_folder, max_bytes=10 * 1024 ** 3, sample_rate=16000):
+        self.cache_folder = Path(cache_folder)
+        self.cache_folder.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.sample_rate = sample_rate
+        self._hashes = {}
+
+    def source_hash(self, audio_path):
+        """SHA-256 of the source file, memoized on path, size and mtime"""
+        stat = os.stat(audio_path)
+        key = (str(Path(audio_path).resolve()), stat.st_size, stat.st_mtime_ns)
+        if key not in self._hashes:
+            digest = hashlib.sha256()
+            with open(audio_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+            self._hashes[key] = digest.hexdigest()
+        return self._hashes[key]
+
+    def cache_path(self, audio_path):
+        """Cache file location for a source, keyed on its content and sample rate"""
+        return self.cache_folder / f"{self.source_hash(audio_path)}_{self.sample_rate}.pcm"
+
+    def load(self, audio_path):
+        """Return the decoded samples of a source as a read-only int16 memmap"""
+        pcm_path = self.cache_path(audio_path)
+        if pcm_path.exists():
+            logger.info(f"PCM cache hit: {pcm_path.name}")
+            os.utime(pcm_path)  # Mark as recently used for LRU eviction
+        else:
+            self.decode(audio_path, pcm_path)
+            self.evict(keep=pcm_path)
+
+        with open(pcm_path, 'rb') as f:
+            magic, version, sample_rate, channels, sample_width, num_samples = struct.unpack(
+                HEADER_FORMAT, f.read(HEADER_SIZE)
+            )
+        if magic != MAGIC or version != VERSION or sample_rate != self.sample_rate:
+            logger.warning(f"Invalid PCM cache file, decoding again: {pcm_path.name}")
+            pcm_path.unlink()
+            return self.load(audio_path)
+
+        if num_samples == 0:
+            return np.zeros(0, dtype='<i2')
+        return np.memmap(pcm_path, dtype='<i2', mode='r', offset=HEADER_SIZE, shape=(num_samples,))
+
+    def decode(self, audio_path, pcm_path):
+        """Decode a source through ffmpeg and write it atomically to the cache"""
+        logger.info(f"Decoding {audio_path} to PCM cache")
+        audio = AudioSegment.from_file(audio_path)
+        audio = audio.set_frame_rate(self.sample_rate).set_channels(1).set_sample_width(2)
+        raw_data = audio.raw_data
+
+        temp_path = pcm_path.with_suffix(".tmp")
+        with open(temp_path, 'wb') as f:
+            f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, self.sample_rate, 1, 2, len(raw_data) // 2))
+            f.write(raw_data)
+        os.replace(temp_path, pcm_path)
+
+    def evict(self, keep=None):
+        """Remove least recently used cache files until the disk budget is met"""
+        entries = [(p.stat().st_mtime, p.stat().st_size, p) for p in self.cache_folder.glob("*.pcm")]
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, pcm_path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            if pcm_path == keep:
+                continue
+            logger.info(f"Evicting PCM cache file: {pcm_path.name}")
+            pcm_path.unlink()
+            total_bytes -= size
+
+    def ms_to_sample(self, ms):
+        """Convert a millisecond offset to a sample index"""
+        return ms * self.sample_rate // 1000
+
+    def duration_ms(self, samples):
+        """Duration of a sample array in milliseconds"""
+        return len(samples) * 1000 // self.sample_rate
+
+    def to_segment(self, samples):
+        """Wrap a PCM slice in an AudioSegment for export"""
+        return AudioSegment(
+            data=np.ascontiguousarray(samples).tobytes(),
+            sample_width=2,
+            frame_rate=self.sample_rate,
+            channels=1
+        )
@@ -0,0 +1,136 @@
+# concurrency.py - Adaptive in-flight request limit for API calls
+import time
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limiter driven by observed p95 latency, errors and throttling"""
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=16, window_size=20,
+                 latency_tolerance=2.0, error_rate_threshold=0.2, history_size=200):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.window_size = window_size
+        self.latency_tolerance = latency_tolerance
+        self.error_rate_threshold = error_rate_threshold
+
+        self.in_flight = 0
+        self.latencies = deque(maxlen=window_size)
+        self.outcomes = deque(maxlen=window_size)
+        self.baseline_p95 = None
+        self.samples_since_decrease = 0
+        self.last_throttle_decrease = 0.0
+        self.totals = {"requests": 0, "throttled": 0, "errors": 0}
+        self.history = deque(maxlen=history_size)
+        self._condition = threading.Condition()
+
+    @property
+    def current_limit(self):
+        return max(self.min_limit, min(self.max_limit, int(self.limit)))
+
+    def acquire(self):
+        """Block until an in-flight slot is free"""
+        with self._condition:
+            while self.in_flight >= self.current_limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency_s, outcome="success"):
+        """Record a finished request ('success', 'throttled' or 'error') and adapt the limit"""
+        with self._condition:
+            self.in_flight -= 1
+            self.totals["requests"] += 1
+            self.outcomes.append(outcome)
+            self.samples_since_decrease += 1
+
+            if outcome == "throttled":
+                self.totals["throttled"] += 1
+                # Requests already in flight at the last cut say nothing about the new limit
+                if time.monotonic() - latency_s >= self.last_throttle_decrease:
+                    self._decrease(0.5, "throttled")
+            elif outcome == "error":
+                self.totals["errors"] += 1
+                error_rate = sum(o != "success" for o in self.outcomes) / len(self.outcomes)
+                if len(self.outcomes) >= self.window_size // 2 and error_rate > self.error_rate_threshold:
+                    self._decrease(0.75, f"error rate {error_rate:.0%}")
+            else:
+                self.latencies.append(latency_s)
+                p95 = self.p95()
+                if len(self.latencies) >= self.window_size // 2:
+                    if self.baseline_p95 is None or p95 < self.baseline_p95:
+                        self.baseline_p95 = p95
+                    if p95 > self.baseline_p95 * self.latency_tolerance:
+                        self._decrease(0.9, f"p95 {p95:.2f}s over {self.baseline_p95:.2f}s baseline")
+                    else:
+                        self._increase()
+                else:
+                    self._increase()
+
+            self._condition.notify_all()
+
+    def p95(self):
+        """95th percentile of recent successful request latencies"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def _increase(self):
+        # Additive increase: roughly +1 slot per full window of successes
+        previous = self.current_limit
+        self.limit = min(self.max_limit, self.limit + 1 / max(self.limit, 1))
+        if self.current_limit != previous:
+            self._record(previous, "increase")
+
+    def _decrease(self, factor, reason):
+        # Latency and error cuts happen at most once per window so one slow burst does not collapse the limit
+        if reason == "throttled":
+            self.last_throttle_decrease = time.monotonic()
+        elif self.samples_since_decrease < self.window_size:
+            return
+        previous = self.current_limit
+        self.limit = max(self.min_limit, self.limit * factor)
+        self.samples_since_decrease = 0
+        if self.current_limit != previous:
+            self._record(previous, reason)
+        self.latencies.clear()
+
+    def _record(self, previous, reason):
+        p95 = self.p95()
+        self.history.append({
+            "time": time.time(),
+            "from": previous,
+            "to": self.current_limit,
+            "reason": reason,
+            "p95_seconds": round(p95, 3) if p95 is not None else None
+        })
+        logger.info(f"Concurrency limit {previous} -> {self.current_limit} ({reason})")
+
+    def snapshot(self):
+        """Current controller state and change history for logs and metrics"""
+        with self._condition:
+            p95 = self.p95()
+            return {
+                "taken_at": time.time(),
+                "limit": self.current_limit,
+                "in_flight": self.in_flight,
+                "p95_seconds": round(p95, 3) if p95 is not None else None,
+                "baseline_p95_seconds": round(self.baseline_p95, 3) if self.baseline_p95 is not None else None,
+                **self.totals,
+                "history": list(self.history)
+            }
+
+    def delta(self, since):
+        """Controller activity between an earlier snapshot and now"""
+        now = self.snapshot()
+        return {
+            "limit_start": since["limit"],
+            "limit_end": now["limit"],
+            "p95_seconds": now["p95_seconds"],
+            **{key: now[key] - since[key] for key in self.totals},
+            "history": [change for change in now["history"] if change["time"] >= since["taken_at"]]
+        }
@@ -0,0 +1,175 @@
+# diarization.py - Local CPU speaker/turn segmentation
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class SpeakerDiarizer:
+    """Cluster voiced audio into speakers using NumPy frame features"""
+
+    def __init__(self, num_speakers=2, frame_ms=25, hop_ms=10, segment_ms=1000,
+                 num_bands=24, min_voiced_ratio=0.3, block_seconds=60,
+                 noise_percentile=5, voicing_margin_db=6, min_energy_db=-75):
+        self.num_speakers = num_speakers
+        self.frame_ms = frame_ms
+        self.hop_ms = hop_ms
+        self.segment_ms = segment_ms
+        self.num_bands = num_bands
+        self.min_voiced_ratio = min_voiced_ratio
+        self.block_seconds = block_seconds
+        self.noise_percentile = noise_percentile
+        self.voicing_margin_db = voicing_margin_db
+        self.min_energy_db = min_energy_db
+
+    def mel_filterbank(self, sample_rate, n_fft):
+        """Triangular mel filterbank as a (bands, bins) matrix"""
+        def hz_to_mel(hz):
+            return 2595 * np.log10(1 + hz / 700)
+
+        def mel_to_hz(mel):
+            return 700 * (10 ** (mel / 2595) - 1)
+
+        mel_points = np.linspace(hz_to_mel(60), hz_to_mel(sample_rate / 2), self.num_bands + 2)
+        bins = np.floor((n_fft + 1) * mel_to_hz(mel_points) / sample_rate).astype(int)
+
+        filterbank = np.zeros((self.num_bands, n_fft // 2 + 1), dtype=np.float32)
+        for band in range(self.num_bands):
+            left, center, right = bins[band], bins[band + 1], bins[band + 2]
+            if center > left:
+                filterbank[band, left:center] = (np.arange(left, center) - left) / (center - left)
+            if right > center:
+                filterbank[band, center:right] = (right - np.arange(center, right)) / (right - center)
+        return filterbank
+
+    def frame_features(self, samples, sample_rate):
+        """Log mel band energies and frame energy in dB for every hop"""
+        frame_len = sample_rate * self.frame_ms // 1000
+        hop_len = sample_rate * self.hop_ms // 1000
+        n_fft = 1 << (frame_len - 1).bit_length()
+        window = np.hanning(frame_len).astype(np.float32)
+        filterbank = self.mel_filterbank(sample_rate, n_fft)
+
+        features = []
+        energies = []
+        # Work in blocks so long recordings never materialise every frame at once
+        block_len = sample_rate * self.block_seconds
+        for block_start in range(0, len(samples), block_len):
+            block = np.asarray(samples[block_start:block_start + block_len + frame_len - hop_len], dtype=np.float32)
+            if len(block) < frame_len:
+                break
+            frames = np.lib.stride_tricks.sliding_window_view(block, frame_len)[::hop_len]
+            frames = frames[:block_len // hop_len] / 32768.0
+            spectrum = np.abs(np.fft.rfft(frames * window, n=n_fft)) ** 2
+            features.append(np.log(spectrum @ filterbank.T + 1e-10))
+            energies.append(10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10))
+
+        if not features:
+            return np.zeros((0, self.num_bands), dtype=np.float32), np.zeros(0, dtype=np.float32)
+        return np.concatenate(features), np.concatenate(energies)
+
+    def segment_embeddings(self, features, energies):
+        """Average voiced frames into fixed-length segments"""
+        frames_per_segment = self.segment_ms // self.hop_ms
+        num_segments = len(features) // frames_per_segment
+        if num_segments == 0:
+            return np.zeros((0, self.num_bands)), np.zeros(0, dtype=int)
+
+        features = features[:num_segments * frames_per_segment].reshape(num_segments, frames_per_segment, -1)
+        energies = energies[:num_segments * frames_per_segment].reshape(num_segments, frames_per_segment)
+
+        # Frames a fixed margin above the noise floor count as speech. The floor is a low percentile of
+        # frame energies, which still reaches the gaps between words when a recording has no pauses,
+        # and never depends on how loud the loudest speaker is
+        noise_floor = np.percentile(energies, self.noise_percentile)
+        voiced = energies > max(noise_floor + self.voicing_margin_db, self.min_energy_db)
+        voiced_ratio = voiced.mean(axis=1)
+        keep = np.flatnonzero(voiced_ratio >= self.min_voiced_ratio)
+
+        voiced_counts = voiced[keep].sum(axis=1, keepdims=True)
+        embeddings = (features[keep] * voiced[keep][:, :, None]).sum(axis=1) / voiced_counts
+        return embeddings, keep
+
+    def kmeans(self, points, iterations=50, seed=0):
+        """Plain k-means with k-means++ seeding"""
+        rng = np.random.default_rng(seed)
+        centroids = [points[rng.integers(len(points))]]
+        for _ in range(1, self.num_speakers):
+            distances = np.min(((points[:, None, :] - np.array(centroids)[None]) ** 2).sum(-1), axis=1)
+            if distances.sum() == 0:
+                break
+            centroids.append(points[rng.choice(len(points), p=distances / distances.sum())])
+        centroids = np.array(centroids)
+
+        labels = np.zeros(len(points), dtype=int)
+        for iteration in range(iterations):
+            distances = ((points[:, None, :] - centroids[None]) ** 2).sum(-1)
+            new_labels = distances.argmin(axis=1)
+            if iteration > 0 and np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+            for k in range(len(centroids)):
+                if np.any(labels == k):
+                    centroids[k] = points[labels == k].mean(axis=0)
+        return labels
+
+    def smooth_labels(self, labels, width=3):
+        """Majority filter to remove single-segment speaker flips"""
+        if len(labels) < width:
+            return labels
+        pad = width // 2
+        padded = np.pad(labels, pad, mode='edge')
+        windows = np.lib.stride_tricks.sliding_window_view(padded, width)
+        counts = np.stack([(windows == k).sum(axis=1) for k in range(self.num_speakers)], axis=1)
+        return counts.argmax(axis=1)
+
+    def diarize(self, samples, sample_rate):
+        """Return speaker turns as a list of {speaker, start_ms, end_ms}"""
+        started = time.perf_counter()
+        features, energies = self.frame_features(samples, sample_rate)
+        embeddings, segment_index = self.segment_embeddings(features, energies)
+        if len(embeddings) < self.num_speakers:
+            logger.warning("Not enough voiced audio for speaker diarization")
+            return []
+
+        # Mean normalisation only: log-mel bands share units, and scaling each band by its own spread
+        # lets near-constant bands outweigh the bands that actually separate voices
+        embeddings = embeddings - embeddings.mean(axis=0)
+        labels = self.smooth_labels(self.kmeans(embeddings))
+
+        # Rank speakers by talk time so SPEAKER_0 is the dominant voice (usually the teacher)
+        order = np.argsort(-np.bincount(labels, minlength=self.num_speakers), kind='stable')
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        labels = rank[labels]
+
+        turns = []
+        for segment, label in zip(segment_index, labels):
+            start_ms = int(segment) * self.segment_ms
+            speaker = f"SPEAKER_{label}"
+            if turns and turns[-1]['speaker'] == speaker and turns[-1]['end_ms'] == start_ms:
+                turns[-1]['end_ms'] = start_ms + self.segment_ms
+            else:
+                turns.append({'speaker': speaker, 'start_ms': start_ms, 'end_ms': start_ms + self.segment_ms})
+
+        elapsed = time.perf_counter() - started
+        audio_seconds = len(samples) / sample_rate
+        logger.info(f"Diarized {audio_seconds:.1f}s audio into {len(turns)} turns in {elapsed:.2f}s "
+                    f"({audio_seconds / max(elapsed, 1e-6):.0f}x real time)")
+        return turns
+
+    def summarize(self, turns):
+        """Talk time per speaker, treating the dominant speaker as the teacher"""
+        talk_time_ms = {}
+        for turn in turns:
+            talk_time_ms[turn['speaker']] = talk_time_ms.get(turn['speaker'], 0) + turn['end_ms'] - turn['start_ms']
+
+        total_ms = sum(talk_time_ms.values())
+        teacher_ms = talk_time_ms.get("SPEAKER_0", 0)
+        return {
+            "num_speakers": len(talk_time_ms),
+            "teacher_speaker": "SPEAKER_0" if teacher_ms else None,
+            "talk_time_seconds": {speaker: ms / 1000 for speaker, ms in sorted(talk_time_ms.items())},
+            "teacher_talk_ratio": round(teacher_ms / total_ms, 3) if total_ms else None,
+            "speaker_turns": len(turns)
+        }
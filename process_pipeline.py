@@ -1,17 +1,40 @@
 # process_pipeline.py - Audio Processing Pipeline
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import os
+import sys
+import argparse
 import tempfile
 import json
 import shutil
+import sqlite3
 from pathlib import Path
 from datetime import datetime
-from pydub import AudioSegment
-from openai import OpenAI
-from dotenv import load_dotenv
+import re
 import logging
-import time
 import random
-from tenacity import retry, stop_after_attempt, wait_exponential
+from concurrent.futures import ThreadPoolExecutor
+from concurrency import AdaptiveConcurrencyLimiter
+
+# Heavy dependencies (pydub, openai, dotenv, numpy) are imported where they are used
+# so that `stats` and `--help` start instantly
+STARTUP_BUDGET_SECONDS = 0.25
+
+# Column order used when writing rows to the chunk table
+CHUNK_TABLE_COLUMNS = (
+    "file_stem", "chunk_id", "start_ms", "end_ms", "duration_ms", "urdu_text", "english_translation",
+    "urdu_word_count", "english_word_count", "has_urdu_script", "error", "processing_date",
+    "dominant_speaker", "quality_suspect", "quality_action"
+)
+CHUNK_TABLE_ADDED_COLUMNS = (
+    ("dominant_speaker", "TEXT"),
+    ("quality_suspect", "INTEGER"),
+    ("quality_action", "TEXT")
+)
+
+# Context prompt for re-requesting chunks that look hallucinated ("A classroom conversation between a teacher and students.")
+RETRY_URDU_PROMPT = "یہ کلاس روم میں استاد اور طلبہ کی گفتگو ہے۔"
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,23 +42,44 @@ logger = logging.getLogger(__name__)
 
 class UrduTranscriptionPipeline:
     def __init__(self):
+        from openai import OpenAI
+        from dotenv import load_dotenv
+        from audio_cache import DecodedAudioCache
+        from diarization import SpeakerDiarizer
+        from quality_check import ChunkQualityChecker
+        
         # Load API Key
         load_dotenv()
         self.api_key = os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("OpenAI API key not found. Please set OPENAI_API_KEY in your .env file")
         
-        self.client = OpenAI(api_key=self.api_key)
+        # SDK retries are disabled so throttling reaches call_api and the concurrency limiter
+        self.client = OpenAI(api_key=self.api_key, max_retries=0)
         
         # Setup folder structure
         self.setup_folders()
         
+        # Decoded PCM cache so re-chunking does not re-run ffmpeg
+        self.audio_cache = DecodedAudioCache(self.pcm_cache_folder)
+        
+        # Local speaker segmentation for teacher talk-time analytics
+        self.diarizer = SpeakerDiarizer()
+        
+        # Hallucination and repetition checks per chunk
+        self.quality_checker = ChunkQualityChecker()
+        
+        # Adaptive in-flight request limit shared by every file in this run
+        self.concurrency = AdaptiveConcurrencyLimiter()
+        
     def setup_folders(self):
         """Create organized folder structure"""
         self.base_folder = Path("processed_data")
         self.audio_folder = self.base_folder / "audio"
         self.urdu_folder = self.base_folder / "urdu"
         self.english_folder = self.base_folder / "english"
+        self.chunks_db = self.base_folder / "chunks.sqlite"
+        self.pcm_cache_folder = self.base_folder / "pcm_cache"
         
         # Create folders if they don't exist
         for folder in [self.base_folder, self.audio_folder, self.urdu_folder, self.english_folder]:
@@ -47,8 +91,8 @@ class UrduTranscriptionPipeline:
         """Split audio into chunks with metadata"""
         logger.info(f"Loading audio file: {audio_path}")
         try:
-            audio = AudioSegment.from_file(audio_path)
-            duration_ms = len(audio)
+            samples = self.audio_cache.load(audio_path)
+            duration_ms = self.audio_cache.duration_ms(samples)
             step_ms = chunk_size_ms - overlap_ms
             
             chunks = []
@@ -56,11 +100,14 @@ class UrduTranscriptionPipeline:
             
             for start_ms in range(0, duration_ms, step_ms):
                 end_ms = min(start_ms + chunk_size_ms, duration_ms)
-                chunk = audio[start_ms:end_ms]
+                # Memory-mapped view, no copy until the chunk is exported
+                chunk = samples[self.audio_cache.ms_to_sample(start_ms):self.audio_cache.ms_to_sample(end_ms)]
                 chunks.append(chunk)
                 
                 # Add metadata
                 chunk_metadata.append({
+                    'start_ms': start_ms,
+                    'end_ms': end_ms,
                     'start_time': self.ms_to_timestamp(start_ms),
                     'end_time': self.ms_to_timestamp(end_ms),
                     'duration_ms': end_ms - start_ms
@@ -80,79 +127,210 @@ class UrduTranscriptionPipeline:
         milliseconds = (ms % 1000) // 10
         return f"{minutes:02d}:{seconds:02d}:{milliseconds:02d}"
     
-    def process_chunks(self, chunks, chunk_metadata):
+    def timestamp_to_ms(self, timestamp):
+        """Convert a timestamp produced by ms_to_timestamp back to milliseconds"""
+        minutes, seconds, centiseconds = (int(part) for part in timestamp.split(":"))
+        return minutes * 60000 + seconds * 1000 + centiseconds * 10
+    
+    def call_api(self, create, max_retries=3, **kwargs):
+        """Make one API request under the adaptive concurrency limit, retrying throttling and transient errors"""
+        for attempt in range(max_retries):
+            # A previous attempt has already read the upload to EOF
+            if 'file' in kwargs and hasattr(kwargs['file'], 'seek'):
+                kwargs['file'].seek(0)
+            
+            self.concurrency.acquire()
+            started = time.perf_counter()
+            try:
+                response = create(**kwargs)
+            except Exception as e:
+                status_code = getattr(e, 'status_code', None)
+                throttled = status_code == 429 or type(e).__name__ == "RateLimitError"
+                # Transient failures the SDK used to retry itself before max_retries=0
+                transient = (status_code in (408, 409) or (status_code or 0) >= 500
+                             or type(e).__name__ in ("APIConnectionError", "APITimeoutError")
+                             or isinstance(e, (ConnectionError, TimeoutError)))
+                self.concurrency.release(time.perf_counter() - started, "throttled" if throttled else "error")
+                if not (throttled or transient) or attempt == max_retries - 1:
+                    raise
+                
+                wait_time = (2 ** attempt) + random.uniform(1, 3)  # Exponential backoff
+                logger.warning(f"Attempt {attempt + 1} failed ({type(e).__name__}: {e}), waiting {wait_time:.1f}s before retry...")
+                time.sleep(wait_time)
+                continue
+            
+            self.concurrency.release(time.perf_counter() - started, "success")
+            return response
+    
+    def process_chunks(self, chunks, chunk_metadata, noise_floor_db=None):
         """Process each chunk for both transcription and translation - PROVEN APPROACH"""
-        results = []
+        # Workers only bound the pool; the limiter decides how many requests are in flight
+        with ThreadPoolExecutor(max_workers=self.concurrency.max_limit) as executor:
+            futures = [
+                executor.submit(self.process_chunk, i, chunk, metadata, len(chunks), noise_floor_db)
+                for i, (chunk, metadata) in enumerate(zip(chunks, chunk_metadata))
+            ]
+            results = [future.result() for future in futures]
+        
+        state = self.concurrency.snapshot()
+        logger.info(f"Concurrency after {len(chunks)} chunks: limit={state['limit']} p95={state['p95_seconds']}s "
+                    f"requests={state['requests']} throttled={state['throttled']} errors={state['errors']}")
+        return results
+    
+    def process_chunk(self, i, chunk, metadata, total_chunks, noise_floor_db=None):
+        """Transcribe and translate a single chunk"""
+        logger.info(f"Processing chunk {i+1}/{total_chunks}...")
+        
+        # Skip the API for chunks at this recording's noise floor, where Whisper tends to invent text
+        rms_db = self.quality_checker.rms_db(chunk)
+        if self.quality_checker.is_silent(rms_db, noise_floor_db):
+            logger.info(f"Chunk {i+1} is silent ({rms_db:.1f} dBFS, noise floor {noise_floor_db:.1f} dBFS), skipping transcription")
+            return {
+                'chunk_id': i+1,
+                'start_time': metadata['start_time'],
+                'end_time': metadata['end_time'],
+                'start_ms': metadata['start_ms'],
+                'end_ms': metadata['end_ms'],
+                'urdu_text': "",
+                'english_translation': "",
+                'urdu_word_count': 0,
+                'english_word_count': 0,
+                'has_urdu_script': False,
+                'quality': {'suspect': False, 'reasons': ['silence'], 'rms_db': round(rms_db, 1),
+                            'noise_floor_db': round(noise_floor_db, 1), 'action': 'dropped_silence'}
+            }
         
-        for i, (chunk, metadata) in enumerate(zip(chunks, chunk_metadata)):
-            logger.info(f"Processing chunk {i+1}/{len(chunks)}...")
-            
-            # Create temporary file
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-            temp_path = temp_file.name
-            temp_file.close()
+        # Create temporary file
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
+        temp_path = temp_file.name
+        temp_file.close()
+        
+        try:
+            # Export chunk to temporary file
+            self.audio_cache.to_segment(chunk).export(temp_path, format="mp3")
             
-            try:
-                # Export chunk to temporary file
-                chunk.export(temp_path, format="mp3")
+            with open(temp_path, 'rb') as audio_file:
+                # Get Urdu transcription - SIMPLE BASELINE APPROACH
+                audio_file.seek(0)
+                transcription = self.call_api(
+                    self.client.audio.transcriptions.create,
+                    model="whisper-1",
+                    file=audio_file,
+                    language="ur"  # That's it! No prompts, no extra parameters
+                )
                 
-                with open(temp_path, 'rb') as audio_file:
-                    # Get Urdu transcription - SIMPLE BASELINE APPROACH
-                    audio_file.seek(0)
-                    transcription = self.client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file,
-                        language="ur"  # That's it! No prompts, no extra parameters
-                    )
-                    
-                    # Get English translation
-                    audio_file.seek(0)
-                    translation = self.client.audio.translations.create(
-                        model="whisper-1",
-                        file=audio_file
-                    )
+                # Get English translation
+                audio_file.seek(0)
+                translation = self.call_api(
+                    self.client.audio.translations.create,
+                    model="whisper-1",
+                    file=audio_file
+                )
                 
                 # Process results
                 urdu_text = transcription if isinstance(transcription, str) else transcription.text
                 english_text = translation if isinstance(translation, str) else translation.text
                 
-                # Check for Urdu script (for logging)
-                import re
-                has_urdu_chars = bool(re.search(r'[\u0600-\u06FF\u0750-\u077F]', urdu_text))
-                
-                result = {
-                    'chunk_id': i+1,
-                    'start_time': metadata['start_time'],
-                    'end_time': metadata['end_time'],
-                    'urdu_text': urdu_text,
-                    'english_translation': english_text,
-                    'urdu_word_count': len(urdu_text.split()),
-                    'english_word_count': len(english_text.split()),
-                    'has_urdu_script': has_urdu_chars
-                }
-                results.append(result)
-                
-                logger.info(f"Chunk {i+1} completed successfully - Urdu script: {has_urdu_chars}")
-                
-            except Exception as e:
-                logger.error(f"Error processing chunk {i+1}: {e}")
-                result = {
-                    'chunk_id': i+1,
-                    'start_time': metadata['start_time'],
-                    'end_time': metadata['end_time'],
-                    'urdu_text': "[Error in Urdu transcription]",
-                    'english_translation': "[Error in English translation]",
-                    'error': str(e),
-                    'has_urdu_script': False
-                }
-                results.append(result)
-            finally:
-                # Clean up temporary file
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-        
-        return results
+                # Re-request only chunks that look hallucinated or repetitive
+                urdu_text, english_text, quality = self.check_chunk_quality(
+                    audio_file, urdu_text, english_text, metadata['duration_ms'], rms_db, noise_floor_db
+                )
+            
+            # Check for Urdu script (for logging)
+            has_urdu_chars = bool(re.search(r'[\u0600-\u06FF\u0750-\u077F]', urdu_text))
+            
+            result = {
+                'chunk_id': i+1,
+                'start_time': metadata['start_time'],
+                'end_time': metadata['end_time'],
+                'start_ms': metadata['start_ms'],
+                'end_ms': metadata['end_ms'],
+                'urdu_text': urdu_text,
+                'english_translation': english_text,
+                'urdu_word_count': len(urdu_text.split()),
+                'english_word_count': len(english_text.split()),
+                'has_urdu_script': has_urdu_chars,
+                'quality': quality
+            }
+            
+            logger.info(f"Chunk {i+1} completed successfully - Urdu script: {has_urdu_chars}")
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error processing chunk {i+1}: {e}")
+            return {
+                'chunk_id': i+1,
+                'start_time': metadata['start_time'],
+                'end_time': metadata['end_time'],
+                'start_ms': metadata['start_ms'],
+                'end_ms': metadata['end_ms'],
+                'urdu_text': "[Error in Urdu transcription]",
+                'english_translation': "[Error in English translation]",
+                'error': str(e),
+                'has_urdu_script': False
+            }
+        finally:
+            # Clean up temporary file
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
 
+    def check_chunk_quality(self, audio_file, urdu_text, english_text, duration_ms, rms_db, noise_floor_db=None):
+        """Check a transcribed chunk and re-request suspect parts with different parameters"""
+        quality = self.quality_checker.check(urdu_text, english_text, duration_ms, rms_db, noise_floor_db)
+        if not quality['suspect']:
+            quality['action'] = 'kept'
+            return urdu_text, english_text, quality
+        
+        logger.info(f"Suspect chunk ({', '.join(quality['reasons'])}), re-requesting with new parameters")
+        retry_urdu, retry_english = urdu_text, english_text
+        try:
+            if set(quality['reasons']) - {'english_repetition'}:
+                audio_file.seek(0)
+                transcription = self.call_api(
+                    self.client.audio.transcriptions.create,
+                    model="whisper-1",
+                    file=audio_file,
+                    language="ur",
+                    prompt=RETRY_URDU_PROMPT,
+                    temperature=0.4
+                )
+                retry_urdu = transcription if isinstance(transcription, str) else transcription.text
+            
+            if {'english_repetition', 'text_on_quiet_audio'} & set(quality['reasons']):
+                audio_file.seek(0)
+                translation = self.call_api(
+                    self.client.audio.translations.create,
+                    model="whisper-1",
+                    file=audio_file,
+                    temperature=0.4
+                )
+                retry_english = translation if isinstance(translation, str) else translation.text
+        except Exception as e:
+            logger.warning(f"Re-request failed, keeping original text: {e}")
+        
+        # Whisper tends to echo the prompt on silence or noise; that is a failed retry, not a fix
+        prompt_echoed = self.quality_checker.echoes_prompt(retry_urdu, RETRY_URDU_PROMPT)
+        if prompt_echoed:
+            logger.info("Re-request echoed the prompt, discarding it")
+            retry_urdu = urdu_text
+        
+        # Keep whichever attempt raises fewer flags
+        retry_quality = self.quality_checker.check(retry_urdu, retry_english, duration_ms, rms_db, noise_floor_db)
+        if len(retry_quality['reasons']) < len(quality['reasons']):
+            urdu_text, english_text, quality = retry_urdu, retry_english, retry_quality
+            quality['action'] = 'rerequested'
+        else:
+            quality['action'] = 'kept'
+        quality['prompt_echoed'] = prompt_echoed
+        
+        # Still hallucinated-looking on near-silent audio: treat as noise rather than speech
+        if set(quality['reasons']) - {'text_on_quiet_audio'} and quality['quiet']:
+            logger.info(f"Dropping suspect text on quiet audio ({rms_db:.1f} dBFS)")
+            urdu_text, english_text = "", ""
+            quality['action'] = 'dropped_quiet'
+        
+        return urdu_text, english_text, quality
+    
     def process_chunk_with_retries(self, temp_path, urdu_prompt, max_retries=3):
         """Process a single chunk with manual retry logic"""
         import re
@@ -200,21 +378,60 @@ class UrduTranscriptionPipeline:
                 else:
                     raise e  # Re-raise on final attempt
         
-    def save_processed_data(self, audio_path, results, duration_ms):
+    def diarize_audio(self, audio_path):
+        """Segment the audio into speaker turns using the cached PCM"""
+        try:
+            samples = self.audio_cache.load(audio_path)
+            return self.diarizer.diarize(samples, self.audio_cache.sample_rate)
+        except Exception as e:
+            logger.warning(f"Speaker diarization failed, continuing without speakers: {e}")
+            return []
+    
+    def attach_speaker_turns(self, results, speaker_turns):
+        """Add the speaker turns overlapping each chunk to its result"""
+        for result in results:
+            start_ms = result['start_ms']
+            end_ms = result['end_ms']
+            chunk_turns = [
+                {
+                    'speaker': turn['speaker'],
+                    'start_ms': max(turn['start_ms'], start_ms),
+                    'end_ms': min(turn['end_ms'], end_ms)
+                }
+                for turn in speaker_turns
+                if turn['start_ms'] < end_ms and turn['end_ms'] > start_ms
+            ]
+            
+            talk_time_ms = {}
+            for turn in chunk_turns:
+                talk_time_ms[turn['speaker']] = talk_time_ms.get(turn['speaker'], 0) + turn['end_ms'] - turn['start_ms']
+            
+            result['speaker_turns'] = chunk_turns
+            result['dominant_speaker'] = max(talk_time_ms, key=talk_time_ms.get) if talk_time_ms else None
+        return results
+    
+    def save_processed_data(self, audio_path, results, duration_ms, speaker_turns=None, concurrency_stats=None):
         """Save all processed data in organized structure"""
         file_stem = Path(audio_path).stem
         
         # Copy audio file to processed audio folder
         audio_output = self.audio_folder / f"{file_stem}.mp3"
         
-        # Convert original audio to MP3 if needed
-        audio = AudioSegment.from_file(audio_path)
-        audio.export(audio_output, format="mp3")
-        logger.info(f"Audio saved to: {audio_output}")
+        # Convert original audio to MP3 unless the existing copy was made from the same source content
+        source_hash = self.audio_cache.source_hash(audio_path)
+        hash_output = audio_output.with_suffix(".sha256")
+        if audio_output.exists() and hash_output.exists() and hash_output.read_text().strip() == source_hash:
+            logger.info(f"Audio already saved at: {audio_output}")
+        else:
+            from pydub import AudioSegment
+            audio = AudioSegment.from_file(audio_path)
+            audio.export(audio_output, format="mp3")
+            hash_output.write_text(source_hash)
+            logger.info(f"Audio saved to: {audio_output}")
         
         # Combine all transcriptions
-        urdu_text = " ".join([r['urdu_text'] for r in results if not r['urdu_text'].startswith('[Error')])
-        english_text = " ".join([r['english_translation'] for r in results if not r['english_translation'].startswith('[Error')])
+        urdu_text = " ".join([r['urdu_text'] for r in results if r['urdu_text'] and not r['urdu_text'].startswith('[Error')])
+        english_text = " ".join([r['english_translation'] for r in results if r['english_translation'] and not r['english_translation'].startswith('[Error')])
         
         # Save Urdu transcription
         urdu_output = self.urdu_folder / f"{file_stem}.txt"
@@ -233,6 +450,7 @@ class UrduTranscriptionPipeline:
             "metadata": {
                 "original_file": str(audio_path),
                 "processed_file": str(audio_output),
+                "source_sha256": source_hash,
                 "processing_date": datetime.now().isoformat(),
                 "duration_seconds": duration_ms / 1000,
                 "total_chunks": len(results)
@@ -241,8 +459,13 @@ class UrduTranscriptionPipeline:
             "summary": {
                 "total_urdu_words": sum(r.get('urdu_word_count', 0) for r in results),
                 "total_english_words": sum(r.get('english_word_count', 0) for r in results),
-                "successful_chunks": len([r for r in results if not r['urdu_text'].startswith('[Error')])
-            }
+                "successful_chunks": len([r for r in results if not r['urdu_text'].startswith('[Error')]),
+                "suspect_chunks": len([r for r in results if r.get('quality', {}).get('suspect')]),
+                "rerequested_chunks": len([r for r in results if r.get('quality', {}).get('action') == 'rerequested']),
+                "dropped_chunks": len([r for r in results if r.get('quality', {}).get('action', '').startswith('dropped')])
+            },
+            "speakers": self.diarizer.summarize(speaker_turns or []),
+            "concurrency": concurrency_stats
         }
         
         # Save detailed JSON
@@ -251,8 +474,93 @@ class UrduTranscriptionPipeline:
             json.dump(file_data, f, ensure_ascii=False, indent=2)
         logger.info(f"Detailed data saved to: {json_output}")
         
+        # Append chunk rows to the columnar chunk table
+        self.store_chunk_records(file_stem, file_data)
+        
         return file_data
     
+    def connect_chunk_store(self):
+        """Open the SQLite chunk table, creating it if needed"""
+        conn = sqlite3.connect(self.chunks_db)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                file_stem TEXT NOT NULL,
+                chunk_id INTEGER NOT NULL,
+                start_ms INTEGER NOT NULL,
+                end_ms INTEGER NOT NULL,
+                duration_ms INTEGER NOT NULL,
+                urdu_text TEXT,
+                english_translation TEXT,
+                urdu_word_count INTEGER NOT NULL DEFAULT 0,
+                english_word_count INTEGER NOT NULL DEFAULT 0,
+                has_urdu_script INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                processing_date TEXT,
+                dominant_speaker TEXT,
+                quality_suspect INTEGER,
+                quality_action TEXT,
+                PRIMARY KEY (file_stem, chunk_id)
+            )
+        """)
+        
+        # Tables created before speaker and quality fields existed get the new columns added in place
+        existing_columns = {row[1] for row in conn.execute("PRAGMA table_info(chunks)")}
+        for column, column_type in CHUNK_TABLE_ADDED_COLUMNS:
+            if column not in existing_columns:
+                conn.execute(f"ALTER TABLE chunks ADD COLUMN {column} {column_type}")
+        
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_processing_date ON chunks (processing_date)")
+        return conn
+    
+    def store_chunk_records(self, file_stem, file_data):
+        """Replace a file's rows in the chunk table with its latest results"""
+        processing_date = file_data["metadata"]["processing_date"]
+        rows = []
+        for r in file_data["chunks"]:
+            # Older results only carry the "MM:SS:cc" strings
+            start_ms = r['start_ms'] if 'start_ms' in r else self.timestamp_to_ms(r['start_time'])
+            end_ms = r['end_ms'] if 'end_ms' in r else self.timestamp_to_ms(r['end_time'])
+            rows.append((
+                file_stem,
+                r['chunk_id'],
+                start_ms,
+                end_ms,
+                end_ms - start_ms,
+                r.get('urdu_text'),
+                r.get('english_translation'),
+                r.get('urdu_word_count', 0),
+                r.get('english_word_count', 0),
+                int(bool(r.get('has_urdu_script', False))),
+                r.get('error'),
+                processing_date,
+                r.get('dominant_speaker'),
+                int(r['quality']['suspect']) if 'quality' in r else None,
+                r['quality'].get('action') if 'quality' in r else None
+            ))
+        
+        conn = self.connect_chunk_store()
+        try:
+            with conn:
+                conn.execute("DELETE FROM chunks WHERE file_stem = ?", (file_stem,))
+                conn.executemany(f"INSERT INTO chunks ({', '.join(CHUNK_TABLE_COLUMNS)}) "
+                                 f"VALUES ({', '.join('?' * len(CHUNK_TABLE_COLUMNS))})", rows)
+        finally:
+            conn.close()
+        logger.info(f"Stored {len(rows)} chunk rows in: {self.chunks_db}")
+    
+    def rebuild_chunk_store(self):
+        """Backfill the chunk table from every existing _detailed.json"""
+        detailed_files = sorted(self.base_folder.glob("*_detailed.json"))
+        for json_file in detailed_files:
+            try:
+                with open(json_file, 'r', encoding='utf-8') as f:
+                    file_data = json.load(f)
+            except (json.JSONDecodeError, ValueError) as e:
+                logger.warning(f"Skipping invalid detailed file {json_file}: {e}")
+                continue
+            self.store_chunk_records(json_file.name[:-len("_detailed.json")], file_data)
+        logger.info(f"Chunk table rebuilt from {len(detailed_files)} detailed files")
+    
     def update_metadata(self, file_data):
         """Update global metadata file"""
         metadata_file = self.base_folder / "metadata.json"
@@ -293,28 +601,40 @@ class UrduTranscriptionPipeline:
             "chunks": file_data["metadata"]["total_chunks"]
         })
         
+        # Run-wide controller state; per-file activity lives in each detailed JSON
+        metadata["concurrency"] = self.concurrency.snapshot()
+        
         # Save updated metadata
         with open(metadata_file, 'w', encoding='utf-8') as f:
             json.dump(metadata, f, ensure_ascii=False, indent=2)
         
         logger.info("Metadata updated successfully")
     
-    def process_file(self, audio_path):
+    def process_file(self, audio_path, chunk_size_ms=30000, overlap_ms=5000):
         """Process a single audio file through the complete pipeline"""
         start_time = datetime.now()
         logger.info(f"Starting processing for: {audio_path}")
         
         try:
             # Step 1: Chunk audio
-            chunks, chunk_metadata, duration_ms = self.chunk_audio(audio_path)
+            chunks, chunk_metadata, duration_ms = self.chunk_audio(audio_path, chunk_size_ms, overlap_ms)
             
             # Step 2: Process chunks
-            results = self.process_chunks(chunks, chunk_metadata)
+            noise_floor_db = self.quality_checker.noise_floor_db(
+                self.audio_cache.load(audio_path), self.audio_cache.sample_rate
+            )
+            concurrency_start = self.concurrency.snapshot()
+            results = self.process_chunks(chunks, chunk_metadata, noise_floor_db)
+            concurrency_stats = self.concurrency.delta(concurrency_start)
+            
+            # Step 3: Attach speaker turns
+            speaker_turns = self.diarize_audio(audio_path)
+            self.attach_speaker_turns(results, speaker_turns)
             
-            # Step 3: Save processed data
-            file_data = self.save_processed_data(audio_path, results, duration_ms)
+            # Step 4: Save processed data
+            file_data = self.save_processed_data(audio_path, results, duration_ms, speaker_turns, concurrency_stats)
             
-            # Step 4: Update metadata
+            # Step 5: Update metadata
             self.update_metadata(file_data)
             
             processing_time = datetime.now() - start_time
@@ -327,7 +647,7 @@ class UrduTranscriptionPipeline:
             logger.error(f"Failed to process {audio_path}: {e}")
             raise
     
-    def process_dataset_folder(self, dataset_path):
+    def process_dataset_folder(self, dataset_path, only_new=False):
         """Process all audio files in a dataset folder"""
         dataset_path = Path(dataset_path)
         
@@ -341,25 +661,180 @@ class UrduTranscriptionPipeline:
         for ext in audio_extensions:
             audio_files.extend(dataset_path.rglob(f"*{ext}"))
         
+        summary = {"found": len(audio_files), "processed": [], "skipped": [], "failed": []}
+        
         if not audio_files:
             logger.warning(f"No audio files found in {dataset_path}")
-            return
+            return summary
         
         logger.info(f"Found {len(audio_files)} audio files to process")
         
         # Process each file
         for i, audio_file in enumerate(audio_files, 1):
+            if only_new and self.is_processed(audio_file):
+                summary["skipped"].append(str(audio_file))
+                continue
+            
             logger.info(f"Processing file {i}/{len(audio_files)}: {audio_file.name}")
             try:
                 self.process_file(audio_file)
+                summary["processed"].append(str(audio_file))
             except Exception as e:
                 logger.error(f"Failed to process {audio_file}: {e}")
+                summary["failed"].append(str(audio_file))
                 continue
         
         logger.info("Dataset processing completed!")
+        return summary
+    
+    def is_processed(self, audio_path):
+        """Check whether the detailed JSON for this stem was produced from this exact source"""
+        file_stem = Path(audio_path).stem
+        json_output = self.base_folder / f"{file_stem}_detailed.json"
+        if not json_output.exists():
+            return False
+        
+        try:
+            with open(json_output, 'r', encoding='utf-8') as f:
+                file_data = json.load(f)
+            file_metadata = file_data["metadata"]
+        except (json.JSONDecodeError, ValueError, KeyError) as e:
+            logger.warning(f"Invalid detailed file {json_output}, reprocessing: {e}")
+            return False
+        
+        # Outputs are keyed on the stem, so a same-named file elsewhere must not count as done
+        if Path(file_metadata.get("original_file", "")).resolve() != Path(audio_path).resolve():
+            logger.warning(f"{json_output.name} belongs to {file_metadata.get('original_file')}, "
+                           f"processing {audio_path} will overwrite it")
+            return False
+        
+        recorded_hash = file_metadata.get("source_sha256")
+        if recorded_hash is not None:
+            if recorded_hash != self.audio_cache.source_hash(audio_path):
+                return False
+        elif json_output.stat().st_mtime < os.path.getmtime(audio_path):
+            # Older results carry no hash
+            return False
+        
+        # The JSON is complete; repair a missing chunk-table write without calling the API again
+        conn = self.connect_chunk_store()
+        try:
+            stored_chunks = conn.execute(
+                "SELECT COUNT(*) FROM chunks WHERE file_stem = ? AND processing_date = ?",
+                (file_stem, file_metadata.get("processing_date"))
+            ).fetchone()[0]
+        finally:
+            conn.close()
+        if stored_chunks != len(file_data.get("chunks", [])):
+            logger.info(f"Chunk table out of date for {file_stem}, restoring from {json_output.name}")
+            self.store_chunk_records(file_stem, file_data)
+        
+        return True
 
-def main():
-    """Main execution function"""
+def collect_stats(base_folder="processed_data"):
+    """Summarise processed data without loading the pipeline"""
+    base_folder = Path(base_folder)
+    metadata = {}
+    metadata_file = base_folder / "metadata.json"
+    if metadata_file.exists() and metadata_file.stat().st_size > 0:
+        try:
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (json.JSONDecodeError, ValueError) as e:
+            logger.warning(f"Invalid metadata.json file: {e}")
+    
+    stats = {
+        "total_files": metadata.get("total_files", 0),
+        "total_duration_seconds": metadata.get("total_duration", 0),
+        "last_processed": metadata.get("last_processed"),
+        "detailed_files": len(list(base_folder.glob("*_detailed.json")))
+    }
+    
+    chunks_db = base_folder / "chunks.sqlite"
+    if chunks_db.exists():
+        conn = sqlite3.connect(chunks_db)
+        try:
+            total_chunks, error_chunks, urdu_script_chunks, urdu_words, english_words = conn.execute(
+                "SELECT COUNT(*), COUNT(error), SUM(has_urdu_script), SUM(urdu_word_count), SUM(english_word_count) FROM chunks"
+            ).fetchone()
+            # Quality and speaker columns only exist once the pipeline has written with them
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(chunks)")}
+            if "quality_action" in columns:
+                stats["quality_actions"] = dict(conn.execute(
+                    "SELECT quality_action, COUNT(*) FROM chunks WHERE quality_action IS NOT NULL GROUP BY quality_action"
+                ).fetchall())
+            if "dominant_speaker" in columns:
+                stats["dominant_speaker_chunks"] = dict(conn.execute(
+                    "SELECT dominant_speaker, COUNT(*) FROM chunks WHERE dominant_speaker IS NOT NULL GROUP BY dominant_speaker"
+                ).fetchall())
+        finally:
+            conn.close()
+        stats.update({
+            "total_chunks": total_chunks,
+            "error_chunks": error_chunks,
+            "urdu_script_ratio": round((urdu_script_chunks or 0) / total_chunks, 3) if total_chunks else 0,
+            "total_urdu_words": urdu_words or 0,
+            "total_english_words": english_words or 0
+        })
+    
+    return stats
+
+def build_parser():
+    """Command line interface for headless runs"""
+    parser = argparse.ArgumentParser(description="Urdu Audio Transcription Pipeline")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON on stdout")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    # Also accept --json after the subcommand without resetting the top-level flag
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", action="store_true", default=argparse.SUPPRESS, help="print the result as JSON on stdout")
+    
+    file_parser = subparsers.add_parser("file", parents=[common], help="process a single audio file")
+    file_parser.add_argument("path")
+    file_parser.add_argument("--chunk-size-ms", type=int, default=30000)
+    file_parser.add_argument("--overlap-ms", type=int, default=5000)
+    
+    folder_parser = subparsers.add_parser("folder", parents=[common], help="process every audio file in a dataset folder")
+    folder_parser.add_argument("path", nargs="?", default="Dataset")
+    
+    sync_parser = subparsers.add_parser("sync", parents=[common], help="process only new or changed files and repair their chunk-table rows")
+    sync_parser.add_argument("path", nargs="?", default="Dataset")
+    
+    stats_parser = subparsers.add_parser("stats", parents=[common], help="summarise processed data")
+    stats_parser.add_argument("--data-folder", default="processed_data")
+    
+    return parser
+
+def run_command(args):
+    """Run a CLI subcommand and return a JSON-serialisable result"""
+    if args.command == "stats":
+        return collect_stats(args.data_folder)
+    
+    # Validate the path before the pipeline needs an API key or creates folders
+    if args.command == "file" and not os.path.isfile(args.path):
+        raise FileNotFoundError(f"File not found: {args.path}")
+    if args.command in ("folder", "sync") and not os.path.isdir(args.path):
+        raise FileNotFoundError(f"Dataset folder not found: {args.path}")
+    
+    pipeline = UrduTranscriptionPipeline()
+    
+    if args.command == "file":
+        file_data = pipeline.process_file(args.path, args.chunk_size_ms, args.overlap_ms)
+        return {
+            "metadata": file_data["metadata"],
+            "summary": file_data["summary"],
+            "speakers": file_data["speakers"]
+        }
+    
+    if args.command == "folder":
+        return pipeline.process_dataset_folder(args.path)
+    
+    if args.command == "sync":
+        # is_processed already restores missing chunk-table rows for skipped files
+        return pipeline.process_dataset_folder(args.path, only_new=True)
+
+def interactive_main():
+    """Interactive prompts, used when no subcommand is given on a terminal"""
     print("🎵 Urdu Audio Transcription Pipeline")
     print("=" * 50)
     
@@ -412,5 +887,41 @@ def main():
     print("🚀 You can now run the Streamlit app:")
     print("streamlit run streamlit_app.py")
 
+def main(argv=None):
+    """Main execution function"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    
+    startup_seconds = time.perf_counter() - _IMPORT_STARTED
+    if startup_seconds > STARTUP_BUDGET_SECONDS:
+        logger.warning(f"Startup took {startup_seconds:.3f}s, over the {STARTUP_BUDGET_SECONDS}s budget")
+    else:
+        logger.debug(f"Startup took {startup_seconds:.3f}s")
+    
+    if args.command is None:
+        if sys.stdin.isatty():
+            interactive_main()
+            return 0
+        parser.print_help()
+        return 2
+    
+    try:
+        result = run_command(args)
+    except Exception as e:
+        logger.error(f"{args.command} failed: {e}")
+        if args.json:
+            print(json.dumps({"command": args.command, "ok": False, "error": str(e)}, ensure_ascii=False))
+        return 1
+    
+    failed = isinstance(result, dict) and bool(result.get("failed"))
+    if args.json:
+        print(json.dumps({"command": args.command, "ok": not failed, "result": result,
+                          "startup_seconds": round(startup_seconds, 4)}, ensure_ascii=False, indent=2))
+    else:
+        print(f"✅ {args.command} completed")
+        for key, value in result.items():
+            print(f"{key}: {len(value) if isinstance(value, list) else value}")
+    return 1 if failed else 0
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
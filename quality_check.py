@@ -0,0 +1,109 @@
+# quality_check.py - Per-chunk hallucination and repetition checks
+import re
+import numpy as np
+
+URDU_SCRIPT = re.compile(r'[\u0600-\u06FF\u0750-\u077F]')
+
+class ChunkQualityChecker:
+    """Flag transcripts that look like Whisper hallucinations on silent or noisy audio"""
+
+    def __init__(self, silence_db=-50, silence_margin_db=3, quiet_margin_db=6, max_repetition_ratio=0.4,
+                 max_words_per_second=6.0, min_script_ratio=0.5, ngram_size=3):
+        self.silence_db = silence_db
+        self.silence_margin_db = silence_margin_db
+        self.quiet_margin_db = quiet_margin_db
+        self.max_repetition_ratio = max_repetition_ratio
+        self.max_words_per_second = max_words_per_second
+        self.min_script_ratio = min_script_ratio
+        self.ngram_size = ngram_size
+
+    def rms_db(self, samples):
+        """RMS level of int16 PCM in dBFS"""
+        if len(samples) == 0:
+            return -120.0
+        rms = np.sqrt(np.mean(np.square(np.asarray(samples, dtype=np.float32) / 32768.0)))
+        return float(20 * np.log10(rms + 1e-6))
+
+    def noise_floor_db(self, samples, sample_rate, window_ms=1000, block_windows=60):
+        """Recording noise floor: 10th percentile of the RMS level of 1 s windows"""
+        window_len = sample_rate * window_ms // 1000
+        num_windows = len(samples) // window_len
+        if num_windows == 0:
+            return None
+        window_db = []
+        # Blocks keep memory flat on long memory-mapped recordings
+        for start in range(0, num_windows, block_windows):
+            stop = min(start + block_windows, num_windows)
+            block = np.asarray(samples[start * window_len:stop * window_len], dtype=np.float32) / 32768.0
+            rms = np.sqrt(np.mean(np.square(block.reshape(stop - start, window_len)), axis=1))
+            window_db.append(20 * np.log10(rms + 1e-6))
+        return float(np.percentile(np.concatenate(window_db), 10))
+
+    def is_silent(self, rms_db, noise_floor_db):
+        """True when a chunk is both absolutely quiet and at this recording's noise floor"""
+        if noise_floor_db is None:
+            return False
+        return rms_db < self.silence_db and rms_db < noise_floor_db + self.silence_margin_db
+
+    def is_quiet(self, rms_db, noise_floor_db):
+        """True when a chunk sits close to this recording's noise floor"""
+        if noise_floor_db is None:
+            return False
+        return rms_db < noise_floor_db + self.quiet_margin_db
+
+    def repetition_ratio(self, text):
+        """Share of word n-grams that repeat an earlier n-gram"""
+        words = text.split()
+        if len(words) < self.ngram_size * 2:
+            return 0.0
+        ngrams = [tuple(words[i:i + self.ngram_size]) for i in range(len(words) - self.ngram_size + 1)]
+        return 1 - len(set(ngrams)) / len(ngrams)
+
+    def script_ratio(self, text):
+        """Share of letters written in Arabic/Urdu script"""
+        letters = [c for c in text if c.isalpha()]
+        if not letters:
+            return 1.0
+        return sum(bool(URDU_SCRIPT.match(c)) for c in letters) / len(letters)
+
+    def echoes_prompt(self, text, prompt):
+        """True when a transcript mostly repeats the prompt it was requested with"""
+        text_words = re.findall(r'\w+', text)
+        prompt_words = set(re.findall(r'\w+', prompt))
+        if not text_words or not prompt_words:
+            return False
+        if prompt_words <= set(text_words):
+            return True
+        return sum(word in prompt_words for word in text_words) / len(text_words) >= 0.5
+
+    def check(self, urdu_text, english_text, duration_ms, rms_db, noise_floor_db=None):
+        """Score a transcribed chunk and list the reasons it looks suspect"""
+        duration_s = max(duration_ms / 1000, 1e-3)
+        urdu_repetition = self.repetition_ratio(urdu_text)
+        english_repetition = self.repetition_ratio(english_text)
+        words_per_second = len(urdu_text.split()) / duration_s
+        script_ratio = self.script_ratio(urdu_text)
+
+        reasons = []
+        if urdu_repetition > self.max_repetition_ratio:
+            reasons.append("urdu_repetition")
+        if english_repetition > self.max_repetition_ratio:
+            reasons.append("english_repetition")
+        if words_per_second > self.max_words_per_second:
+            reasons.append("too_many_words")
+        if script_ratio < self.min_script_ratio:
+            reasons.append("low_urdu_script")
+        quiet = self.is_quiet(rms_db, noise_floor_db)
+        if urdu_text.strip() and quiet:
+            reasons.append("text_on_quiet_audio")
+
+        return {
+            'suspect': bool(reasons),
+            'reasons': reasons,
+            'urdu_repetition_ratio': round(urdu_repetition, 3),
+            'english_repetition_ratio': round(english_repetition, 3),
+            'words_per_second': round(words_per_second, 2),
+            'script_ratio': round(script_ratio, 3),
+            'rms_db': round(rms_db, 1),
+            'quiet': quiet
+        }
@@ -1,13 +1,10 @@
 # streamlit_app.py - Main Streamlit Application for Deployment
 import streamlit as st
-import os
 import json
-import pandas as pd
 from pathlib import Path
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
 import base64
+import sqlite3
 
 # Set page config
 st.set_page_config(
@@ -122,6 +119,22 @@ def get_transcription_files(data_folder, audio_file_stem):
     
     return urdu_text, english_text
 
+def load_chunk_table(data_folder, columns):
+    """Load selected columns from the chunk table written by the pipeline"""
+    chunks_db = data_folder / "chunks.sqlite"
+    if not chunks_db.exists():
+        return None
+    
+    import pandas as pd
+    
+    conn = sqlite3.connect(chunks_db)
+    try:
+        return pd.read_sql_query(f"SELECT {', '.join(columns)} FROM chunks", conn)
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        return None
+    finally:
+        conn.close()
+
 def create_audio_player(audio_file):
     """Create HTML5 audio player"""
     with open(audio_file, "rb") as f:
@@ -200,6 +213,10 @@ def main():
             # Processing timeline
             st.subheader("Processing Timeline")
             if 'processing_history' in metadata and len(metadata['processing_history']) > 0:
+                # Imported here so pages without charts skip the pandas/plotly import cost
+                import pandas as pd
+                import plotly.express as px
+                
                 df = pd.DataFrame(metadata['processing_history'])
                 # Convert date strings to datetime for better plotting
                 df['date'] = pd.to_datetime(df['date'])
@@ -219,7 +236,7 @@ def main():
         # Instructions
         st.subheader("📋 How to Use")
         st.markdown("""
-        1. **Process Audio Files**: Run `python process_pipeline.py` to process your dataset
+        1. **Process Audio Files**: Run `python process_pipeline.py folder Dataset` (or `sync Dataset` for new files only) to process your dataset
         2. **View Results**: Use the Audio Player to listen and view transcriptions
         3. **Analyze Data**: Check Analytics for detailed insights
         4. **Export Results**: Download processed data from the Analytics page
@@ -230,7 +247,7 @@ def main():
         
         if not audio_files:
             st.warning("No processed audio files found. Please run the processing pipeline first.")
-            st.code("python process_pipeline.py", language="bash")
+            st.code("python process_pipeline.py folder Dataset", language="bash")
             return
         
         # File selector
@@ -317,6 +334,9 @@ def main():
             st.warning("No processed files found.")
             return
         
+        import pandas as pd
+        import plotly.express as px
+        
         # Word count analysis
         word_counts = []
         for audio_file in audio_files:
@@ -348,6 +368,24 @@ def main():
                              title="Urdu vs English Word Count Correlation")
             st.plotly_chart(fig2, use_container_width=True)
         
+        # Chunk-level statistics
+        chunk_df = load_chunk_table(data_folder, ['file_stem', 'duration_ms', 'has_urdu_script', 'error'])
+        if chunk_df is not None and not chunk_df.empty:
+            chunk_df['error_chunk'] = chunk_df['error'].notna()
+            chunk_stats = chunk_df.groupby('file_stem').agg(
+                chunks=('duration_ms', 'size'),
+                audio_minutes=('duration_ms', lambda ms: ms.sum() / 60000),
+                urdu_script_ratio=('has_urdu_script', 'mean'),
+                error_chunks=('error_chunk', 'sum')
+            ).reset_index()
+            
+            st.subheader("🧩 Chunk Statistics")
+            fig3 = px.bar(chunk_stats, x='file_stem', y='urdu_script_ratio',
+                         title="Urdu Script Ratio by File")
+            fig3.update_xaxes(tickangle=45)
+            st.plotly_chart(fig3, use_container_width=True)
+            st.dataframe(chunk_stats, use_container_width=True)
+        
         # Data table
         st.subheader("📊 Detailed Statistics")
         st.dataframe(df, use_container_width=True)